@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# ASGI entry point for running the CRM behind uvicorn instead of http.server:
+#
+#   uvicorn asgi:app --app-dir app --workers 4 --loop uvloop --http httptools
+#
+# uvicorn handles connections, keep-alive and header parsing; each request is
+# replayed through CRMHandler's routing and handlers on a bounded thread pool,
+# so the SQL and per-thread connections are shared with `python app/server.py`.
+# Workers share the database, and with it the cache_version row that keys the
+# cached search/dashboard responses, so a write in one invalidates them in all.
+import asyncio
+import io
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from http.client import HTTPMessage
+
+from server import CRMHandler, CRMServer, init_db, load_static_cache, seed_if_empty
+
+# Hop-by-hop/server headers the ASGI server sets itself
+_DROP_HEADERS = {b'connection', b'date', b'server'}
+
+_pool = ThreadPoolExecutor(max_workers=CRMServer.max_workers, thread_name_prefix='crm-asgi')
+
+
+class ASGIRequest(CRMHandler):
+    # A CRMHandler bound to one buffered ASGI request instead of a socket
+    def __init__(self, scope, body):
+        query = scope.get('query_string', b'')
+        path = scope.get('raw_path') or scope['path'].encode('utf-8')
+        self.command = scope['method']
+        self.path = (path + b'?' + query if query else path).decode('latin-1')
+        self.request_version = 'HTTP/1.1'
+        self.requestline = f'{self.command} {self.path} {self.request_version}'
+        self.client_address = scope.get('client') or ('', 0)
+        self.headers = HTTPMessage()
+        for name, value in scope['headers']:
+            self.headers[name.decode('latin-1')] = value.decode('latin-1')
+        self.body = body
+        self.close_connection = False
+        self.wfile = io.BytesIO()
+        # serve_static's sendfile fallback writes through self.connection
+        self.connection = self
+
+    def sendfile(self, f):
+        shutil.copyfileobj(f, self.wfile)
+
+    def log_request(self, code='-', size='-'):
+        # uvicorn writes its own access log
+        pass
+
+    def respond(self):
+        method = getattr(self, 'do_' + self.command, None)
+        if method is None:
+            self.send_error(501, f'Unsupported method ({self.command!r})')
+        else:
+            method()
+        head, _, body = self.wfile.getvalue().partition(b'\r\n\r\n')
+        lines = head.split(b'\r\n')
+        status = int(lines[0].split(b' ', 2)[1])
+        headers = []
+        for line in lines[1:]:
+            name, _, value = line.partition(b':')
+            name = name.strip().lower()
+            if name not in _DROP_HEADERS:
+                headers.append((name, value.strip()))
+        return status, headers, body
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            init_db()
+            seed_if_empty()
+            load_static_cache()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            _pool.shutdown(wait=False)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await _lifespan(receive, send)
+    if scope['type'] != 'http':
+        return
+    body = b''
+    more_body = True
+    while more_body:
+        message = await receive()
+        body += message.get('body', b'')
+        more_body = message.get('more_body', False)
+    request = ASGIRequest(scope, body)
+    status, headers, payload = await asyncio.get_running_loop().run_in_executor(_pool, request.respond)
+    await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': payload})
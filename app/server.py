@@ -1,154 +1,249 @@
 #!/usr/bin/env python3
+import functools
+import gzip
+import hashlib
 import json
 import os
-import re
+import selectors
+import socket
 import sqlite3
-from datetime import datetime, timezone
-from http.server import HTTPServer, BaseHTTPRequestHandler
-from urllib.parse import parse_qs, urlparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from server_core import fetch_all, fetch_one, fts_query, pick_encoding, pick_fields, query_param, resolve_route, update_sql
+
+try:
+    import orjson
+except ImportError:  # optional; fall back to the stdlib encoder
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # optional; gzip is always available
+    brotli = None
 
 DB_PATH = os.path.join(os.path.dirname(__file__), 'crm.sqlite3')
 STATIC_DIR = os.path.join(os.path.dirname(__file__), 'static')
+STATIC_ROOT = os.path.join(os.path.realpath(STATIC_DIR), '')
 
+# rel_path -> {content encoding ('' = identity): (pre-formatted header bytes, body, etag)};
+# filled by load_static_cache() at startup
+STATIC_CACHE = {}
 
-def now_iso():
-    # Use timezone-aware UTC to avoid deprecation warnings
-    return datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+# Preferred first; bodies smaller than COMPRESS_MIN_SIZE are sent as-is
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+COMPRESS_MIN_SIZE = 1024
+
+# One SQLite connection per thread, opened lazily and kept for the thread's lifetime
+_local = threading.local()
+
+DASHBOARD_TTL = 2.0
+
+
+SCHEMA = '''
+-- Customers
+CREATE TABLE IF NOT EXISTS customers (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    type TEXT DEFAULT 'Individual',
+    email TEXT,
+    phone TEXT,
+    status TEXT DEFAULT 'Active',
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS addresses (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    customer_id INTEGER NOT NULL,
+    line1 TEXT NOT NULL,
+    line2 TEXT,
+    city TEXT,
+    state TEXT,
+    postal_code TEXT,
+    country TEXT DEFAULT 'US',
+    is_primary INTEGER DEFAULT 0,
+    FOREIGN KEY(customer_id) REFERENCES customers(id) ON DELETE CASCADE
+);
+CREATE TABLE IF NOT EXISTS contacts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    customer_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    email TEXT,
+    phone TEXT,
+    role TEXT,
+    FOREIGN KEY(customer_id) REFERENCES customers(id) ON DELETE CASCADE
+);
 
+-- Products
+CREATE TABLE IF NOT EXISTS products (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    sku TEXT UNIQUE NOT NULL,
+    name TEXT NOT NULL,
+    description TEXT,
+    category TEXT,
+    price_cents INTEGER NOT NULL,
+    currency TEXT DEFAULT 'USD',
+    is_active INTEGER DEFAULT 1,
+    created_at TEXT NOT NULL
+);
 
-def dict_factory(cursor, row):
-    d = {}
-    for idx, col in enumerate(cursor.description):
-        d[col[0]] = row[idx]
-    return d
+-- Orders
+CREATE TABLE IF NOT EXISTS orders (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    customer_id INTEGER NOT NULL,
+    status TEXT DEFAULT 'Pending',
+    total_cents INTEGER DEFAULT 0,
+    currency TEXT DEFAULT 'USD',
+    notes TEXT,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    FOREIGN KEY(customer_id) REFERENCES customers(id) ON DELETE CASCADE
+);
+CREATE TABLE IF NOT EXISTS order_items (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    order_id INTEGER NOT NULL,
+    product_id INTEGER NOT NULL,
+    quantity INTEGER NOT NULL,
+    unit_price_cents INTEGER NOT NULL,
+    line_total_cents INTEGER NOT NULL,
+    FOREIGN KEY(order_id) REFERENCES orders(id) ON DELETE CASCADE,
+    FOREIGN KEY(product_id) REFERENCES products(id)
+);
+
+-- Cases
+CREATE TABLE IF NOT EXISTS cases (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    customer_id INTEGER NOT NULL,
+    order_id INTEGER,
+    title TEXT NOT NULL,
+    description TEXT,
+    status TEXT DEFAULT 'Open',
+    priority TEXT DEFAULT 'Medium',
+    assignee TEXT,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    FOREIGN KEY(customer_id) REFERENCES customers(id) ON DELETE CASCADE,
+    FOREIGN KEY(order_id) REFERENCES orders(id) ON DELETE SET NULL
+);
+
+-- Activities (simple audit trail)
+CREATE TABLE IF NOT EXISTS activities (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    entity_type TEXT NOT NULL,
+    entity_id INTEGER NOT NULL,
+    activity TEXT NOT NULL,
+    created_at TEXT NOT NULL
+);
+
+-- Indexes for list ordering and per-customer/per-order lookups
+CREATE INDEX IF NOT EXISTS idx_customers_created ON customers(created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_products_created ON products(created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_orders_created ON orders(created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_orders_customer_created ON orders(customer_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_cases_created ON cases(created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_cases_customer_created ON cases(customer_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_addresses_customer ON addresses(customer_id);
+CREATE INDEX IF NOT EXISTS idx_contacts_customer ON contacts(customer_id);
+CREATE INDEX IF NOT EXISTS idx_order_items_order ON order_items(order_id);
+
+-- Bumped by every write transaction; cached responses are keyed on it so they go
+-- stale automatically, in every server process sharing this database
+CREATE TABLE IF NOT EXISTS cache_version (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    n INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO cache_version(id, n) VALUES (1, 0);
+'''
+
+
+def now_iso():
+    # Format UTC fields directly; cheaper than building a datetime and calling strftime
+    t = time.gmtime()
+    return f'{t.tm_year:04d}-{t.tm_mon:02d}-{t.tm_mday:02d}T{t.tm_hour:02d}:{t.tm_min:02d}:{t.tm_sec:02d}Z'
 
 
 def get_conn():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = dict_factory
-    conn.execute('PRAGMA foreign_keys = ON')
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        conn = sqlite3.connect(DB_PATH)
+        # Writes start with BEGIN IMMEDIATE so writers queue on busy_timeout instead of failing mid-transaction
+        conn.isolation_level = 'IMMEDIATE'
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA foreign_keys = ON')
+        # Per-connection tuning; journal_mode is persisted by init_db()
+        conn.execute('PRAGMA synchronous = NORMAL')
+        conn.execute('PRAGMA temp_store = MEMORY')
+        conn.execute('PRAGMA mmap_size = 268435456')
+        conn.execute('PRAGMA cache_size = -65536')
+        conn.execute('PRAGMA busy_timeout = 5000')
+        _local.conn = conn
     return conn
 
 
+def release_conn():
+    # End the GET read snapshot, or discard a transaction a failed handler left open
+    conn = getattr(_local, 'conn', None)
+    if conn is not None and conn.in_transaction:
+        conn.rollback()
+
+
 def init_db():
     conn = get_conn()
+    # WAL lets readers run alongside a writer and avoids the rollback journal's double fsync.
+    # Workers starting together on a fresh database race to switch it; the loser can get
+    # "database is locked" without busy_timeout applying, so retry for up to 5 s.
+    for attempt in range(50):
+        try:
+            conn.execute('PRAGMA journal_mode = WAL')
+            break
+        except sqlite3.OperationalError:
+            if attempt == 49:
+                raise
+            time.sleep(0.1)
     c = conn.cursor()
-    # Customers
-    c.execute(
-        '''CREATE TABLE IF NOT EXISTS customers (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            type TEXT DEFAULT 'Individual',
-            email TEXT,
-            phone TEXT,
-            status TEXT DEFAULT 'Active',
-            created_at TEXT NOT NULL,
-            updated_at TEXT NOT NULL
-        )'''
-    )
-    c.execute(
-        '''CREATE TABLE IF NOT EXISTS addresses (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            customer_id INTEGER NOT NULL,
-            line1 TEXT NOT NULL,
-            line2 TEXT,
-            city TEXT,
-            state TEXT,
-            postal_code TEXT,
-            country TEXT DEFAULT 'US',
-            is_primary INTEGER DEFAULT 0,
-            FOREIGN KEY(customer_id) REFERENCES customers(id) ON DELETE CASCADE
-        )'''
-    )
-    c.execute(
-        '''CREATE TABLE IF NOT EXISTS contacts (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            customer_id INTEGER NOT NULL,
-            name TEXT NOT NULL,
-            email TEXT,
-            phone TEXT,
-            role TEXT,
-            FOREIGN KEY(customer_id) REFERENCES customers(id) ON DELETE CASCADE
-        )'''
-    )
-
-    # Products
-    c.execute(
-        '''CREATE TABLE IF NOT EXISTS products (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            sku TEXT UNIQUE NOT NULL,
-            name TEXT NOT NULL,
-            description TEXT,
-            category TEXT,
-            price_cents INTEGER NOT NULL,
-            currency TEXT DEFAULT 'USD',
-            is_active INTEGER DEFAULT 1,
-            created_at TEXT NOT NULL
-        )'''
-    )
+    # Collect tables before the schema runs so new FTS indexes can be backfilled
+    existing = {r['name'] for r in c.execute("SELECT name FROM sqlite_master WHERE type='table'").fetchall()}
+    ddl = [SCHEMA]
 
-    # Orders
-    c.execute(
-        '''CREATE TABLE IF NOT EXISTS orders (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            customer_id INTEGER NOT NULL,
-            status TEXT DEFAULT 'Pending',
-            total_cents INTEGER DEFAULT 0,
-            currency TEXT DEFAULT 'USD',
-            notes TEXT,
-            created_at TEXT NOT NULL,
-            updated_at TEXT NOT NULL,
-            FOREIGN KEY(customer_id) REFERENCES customers(id) ON DELETE CASCADE
-        )'''
-    )
-    c.execute(
-        '''CREATE TABLE IF NOT EXISTS order_items (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            order_id INTEGER NOT NULL,
-            product_id INTEGER NOT NULL,
-            quantity INTEGER NOT NULL,
-            unit_price_cents INTEGER NOT NULL,
-            line_total_cents INTEGER NOT NULL,
-            FOREIGN KEY(order_id) REFERENCES orders(id) ON DELETE CASCADE,
-            FOREIGN KEY(product_id) REFERENCES products(id)
-        )'''
-    )
-
-    # Cases
-    c.execute(
-        '''CREATE TABLE IF NOT EXISTS cases (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            customer_id INTEGER NOT NULL,
-            order_id INTEGER,
-            title TEXT NOT NULL,
-            description TEXT,
-            status TEXT DEFAULT 'Open',
-            priority TEXT DEFAULT 'Medium',
-            assignee TEXT,
-            created_at TEXT NOT NULL,
-            updated_at TEXT NOT NULL,
-            FOREIGN KEY(customer_id) REFERENCES customers(id) ON DELETE CASCADE,
-            FOREIGN KEY(order_id) REFERENCES orders(id) ON DELETE SET NULL
-        )'''
-    )
-
-    # Activities (simple audit trail)
-    c.execute(
-        '''CREATE TABLE IF NOT EXISTS activities (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            entity_type TEXT NOT NULL,
-            entity_id INTEGER NOT NULL,
-            activity TEXT NOT NULL,
-            created_at TEXT NOT NULL
-        )'''
-    )
+    # Full-text search over customers/products, kept in sync by triggers
+    fts_tables = [
+        ('customers_fts', 'customers', ['name', 'email']),
+        ('products_fts', 'products', ['name', 'sku', 'description']),
+    ]
+    for fts, base, cols in fts_tables:
+        col_list = ', '.join(cols)
+        new_vals = ', '.join(f'new.{col}' for col in cols)
+        old_vals = ', '.join(f'old.{col}' for col in cols)
+        ddl.append(
+            f'''CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({col_list}, content='{base}', content_rowid='id');
+CREATE TRIGGER IF NOT EXISTS {base}_fts_ai AFTER INSERT ON {base} BEGIN
+    INSERT INTO {fts}(rowid, {col_list}) VALUES (new.id, {new_vals});
+END;
+CREATE TRIGGER IF NOT EXISTS {base}_fts_ad AFTER DELETE ON {base} BEGIN
+    INSERT INTO {fts}({fts}, rowid, {col_list}) VALUES ('delete', old.id, {old_vals});
+END;
+CREATE TRIGGER IF NOT EXISTS {base}_fts_au AFTER UPDATE ON {base} BEGIN
+    INSERT INTO {fts}({fts}, rowid, {col_list}) VALUES ('delete', old.id, {old_vals});
+    INSERT INTO {fts}(rowid, {col_list}) VALUES (new.id, {new_vals});
+END;'''
+        )
+    # One executescript call for the whole schema instead of a prepare per statement
+    c.executescript('\n'.join(ddl))
+    for fts, _base, _cols in fts_tables:
+        if fts not in existing:
+            # Index rows that predate the FTS table
+            c.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
 
     conn.commit()
-    conn.close()
 
 
 def seed_if_empty():
     conn = get_conn()
+    # Take the write lock before counting so concurrently starting workers cannot both seed
+    conn.execute('BEGIN IMMEDIATE')
     c = conn.cursor()
     # Seed customers
     count = c.execute('SELECT COUNT(*) as n FROM customers').fetchone()['n']
@@ -158,19 +253,17 @@ def seed_if_empty():
             ('Acme Telecom', 'Business', 'ops@acme.example', '+1-202-555-0147', 'Active'),
             ('Jane Doe', 'Individual', 'jane@example.com', '+1-202-555-0183', 'Active'),
         ]
-        for name, typ, email, phone, status in customers:
-            c.execute(
-                'INSERT INTO customers(name, type, email, phone, status, created_at, updated_at) VALUES (?,?,?,?,?,?,?)',
-                (name, typ, email, phone, status, now, now),
-            )
-        # Addresses
-        c.execute(
-            'INSERT INTO addresses(customer_id, line1, city, state, postal_code, country, is_primary) VALUES (1,?,?,?,?,?,1)',
-            ('100 Main St', 'Metropolis', 'NY', '10001', 'US'),
+        c.executemany(
+            'INSERT INTO customers(name, type, email, phone, status, created_at, updated_at) VALUES (?,?,?,?,?,?,?)',
+            [(name, typ, email, phone, status, now, now) for name, typ, email, phone, status in customers],
         )
-        c.execute(
-            'INSERT INTO addresses(customer_id, line1, city, state, postal_code, country, is_primary) VALUES (2,?,?,?,?,?,1)',
-            ('55 Pine Ave', 'Springfield', 'IL', '62701', 'US'),
+        # Addresses
+        c.executemany(
+            'INSERT INTO addresses(customer_id, line1, city, state, postal_code, country, is_primary) VALUES (?,?,?,?,?,?,1)',
+            [
+                (1, '100 Main St', 'Metropolis', 'NY', '10001', 'US'),
+                (2, '55 Pine Ave', 'Springfield', 'IL', '62701', 'US'),
+            ],
         )
         # Contacts
         c.execute('INSERT INTO contacts(customer_id, name, email, phone, role) VALUES (?,?,?,?,?)',
@@ -186,11 +279,10 @@ def seed_if_empty():
             ('ROUTER-ACME-1000', 'Acme Home Router 1000', 'WiFi 6 home router', 'Device', 12999),
             ('SIM-TRI-CUT', 'Tri-cut SIM', 'Multi-size SIM card', 'Accessory', 500),
         ]
-        for sku, name, desc, cat, price_cents in products:
-            c.execute(
-                'INSERT INTO products(sku, name, description, category, price_cents, created_at) VALUES (?,?,?,?,?,?)',
-                (sku, name, desc, cat, price_cents, now),
-            )
+        c.executemany(
+            'INSERT INTO products(sku, name, description, category, price_cents, created_at) VALUES (?,?,?,?,?,?)',
+            [(sku, name, desc, cat, price_cents, now) for sku, name, desc, cat, price_cents in products],
+        )
 
     # Seed an order
     ocount = c.execute('SELECT COUNT(*) as n FROM orders').fetchone()['n']
@@ -202,15 +294,11 @@ def seed_if_empty():
         # Add items
         items = c.execute('SELECT id, price_cents FROM products WHERE sku IN (?,?)',
                           ('PLAN-5G-UNL', 'SIM-TRI-CUT')).fetchall()
-        total = 0
-        for prod in items:
-            qty = 1
-            unit = prod['price_cents']
-            line = unit * qty
-            total += line
-            c.execute('INSERT INTO order_items(order_id, product_id, quantity, unit_price_cents, line_total_cents) VALUES (?,?,?,?,?)',
-                      (order_id, prod['id'], qty, unit, line))
-        c.execute('UPDATE orders SET total_cents=?, updated_at=? WHERE id=?', (total, now_iso(), order_id))
+        qty = 1
+        rows = [(order_id, prod['id'], qty, prod['price_cents'], prod['price_cents'] * qty) for prod in items]
+        c.executemany('INSERT INTO order_items(order_id, product_id, quantity, unit_price_cents, line_total_cents) VALUES (?,?,?,?,?)', rows)
+        total = sum(row[4] for row in rows)
+        c.execute('UPDATE orders SET total_cents=?, updated_at=? WHERE id=?', (total, now, order_id))
 
     # Seed a case
     ccount = c.execute('SELECT COUNT(*) as n FROM cases').fetchone()['n']
@@ -220,34 +308,258 @@ def seed_if_empty():
                   (1, 1, 'SIM not activating', 'Customer reports SIM activation failure.', 'Open', 'High', 'agent.alex', now, now))
 
     conn.commit()
-    conn.close()
+
+
+def _json_default(obj):
+    if isinstance(obj, sqlite3.Row):
+        return dict(obj)
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+def encode_json(payload):
+    if orjson is not None:
+        return orjson.dumps(payload, default=_json_default)
+    return json.dumps(payload, default=_json_default).encode('utf-8')
+
+
+def decode_json(body):
+    if orjson is not None:
+        return orjson.loads(body)
+    return json.loads(body.decode('utf-8'))
 
 
 def parse_json(handler):
-    length = int(handler.headers.get('Content-Length', 0))
-    if length == 0:
+    if not handler.body:
         return {}
-    body = handler.rfile.read(length)
     try:
-        return json.loads(body.decode('utf-8'))
+        return decode_json(handler.body)
     except Exception:
         return {}
 
 
 def send_json(handler, status, payload):
-    data = json.dumps(payload).encode('utf-8')
-    handler.send_response(status)
-    handler.send_header('Content-Type', 'application/json')
-    handler.send_header('Content-Length', str(len(data)))
-    handler.end_headers()
-    handler.wfile.write(data)
+    send_json_bytes(handler, status, encode_json(payload))
+
+
+def compress(data, encoding, fast=True):
+    # fast for per-response JSON; static assets are compressed once at full strength
+    if encoding == 'br':
+        return brotli.compress(data, quality=4 if fast else 11)
+    return gzip.compress(data, compresslevel=1 if fast else 9)
+
+
+def json_encoding(handler, data):
+    # Content encoding to send `data` with; '' keeps small bodies uncompressed
+    if len(data) < COMPRESS_MIN_SIZE:
+        return ''
+    return pick_encoding(handler.headers.get('Accept-Encoding', ''), ENCODINGS)
+
+
+def json_variant(data, encoding):
+    # (pre-formatted header bytes, body) for JSON `data` sent with `encoding`
+    headers = b'Content-Type: application/json\r\n'
+    if len(data) >= COMPRESS_MIN_SIZE:
+        headers += b'Vary: Accept-Encoding\r\n'
+        if encoding:
+            data = compress(data, encoding)
+            headers += b'Content-Encoding: %s\r\n' % encoding.encode('latin-1')
+    return headers, data
+
+
+def send_json_bytes(handler, status, data):
+    write_response(handler, status, *json_variant(data, json_encoding(handler, data)))
+
+
+# (epoch second, pre-formatted Date header line); second resolution is all HTTP-date carries
+_date_line = (0, b'')
+
+
+def date_header():
+    global _date_line
+    now = int(time.time())
+    second, line = _date_line
+    if second != now:
+        line = b'Date: %s\r\n' % formatdate(now, usegmt=True).encode('latin-1')
+        _date_line = (now, line)
+    return line
+
+
+def write_response(handler, status, headers, body):
+    # Status line, pre-formatted header bytes and body go out in a single write
+    handler.log_request(status, len(body))
+    head = b'HTTP/1.1 %d %s\r\n%s%sContent-Length: %d\r\nConnection: %s\r\n\r\n' % (
+        status,
+        handler.responses[status][0].encode('latin-1'),
+        date_header(),
+        headers,
+        len(body),
+        b'close' if handler.close_connection else b'keep-alive',
+    )
+    handler.wfile.write(head + body)
+
+
+def content_type(path):
+    if path.endswith('.html'):
+        return 'text/html; charset=utf-8'
+    if path.endswith('.js'):
+        return 'text/javascript; charset=utf-8'
+    if path.endswith('.css'):
+        return 'text/css; charset=utf-8'
+    return 'text/plain'
+
+
+def load_static_cache():
+    # Static assets only change on redeploy, so read them once
+    for root, _dirs, files in os.walk(STATIC_DIR):
+        for name in files:
+            full = os.path.join(root, name)
+            rel = os.path.relpath(full, STATIC_DIR).replace(os.sep, '/')
+            with open(full, 'rb') as f:
+                data = f.read()
+            digest = hashlib.blake2b(data, digest_size=8).hexdigest()
+            bodies = {'': data}
+            if len(data) >= COMPRESS_MIN_SIZE:
+                for encoding in ENCODINGS:
+                    packed = compress(data, encoding, fast=False)
+                    if len(packed) < len(data):
+                        bodies[encoding] = packed
+            variants = {}
+            for encoding, body in bodies.items():
+                # Each representation needs its own strong ETag
+                etag = f'"{digest}-{encoding}"' if encoding else f'"{digest}"'
+                headers = f'Content-Type: {content_type(full)}\r\nETag: {etag}\r\nVary: Accept-Encoding\r\n'
+                if encoding:
+                    headers += f'Content-Encoding: {encoding}\r\n'
+                variants[encoding] = (headers.encode('latin-1'), body, etag)
+            STATIC_CACHE[rel] = variants
 
 
 def not_found(handler):
     send_json(handler, 404, {'error': 'Not found'})
 
 
+# RETURNING (SQLite 3.35+) hands back the written row without a second SELECT
+HAS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+
+def execute_returning(c, sql, params, table, row_id=None):
+    # Run an INSERT/UPDATE and return the affected row (None if no row matched)
+    if HAS_RETURNING:
+        rows = fetch_all(c.execute(sql + ' RETURNING *', params))
+        return rows[0] if rows else None
+    c.execute(sql, params)
+    return fetch_one(c.execute(f'SELECT * FROM {table} WHERE id=?', (c.lastrowid if row_id is None else row_id,)))
+
+
+def commit_write(conn):
+    # The bump commits with the write itself, before the handler sends its response,
+    # so other processes and a client searching right after its own write both see it
+    conn.execute('UPDATE cache_version SET n = n + 1 WHERE id = 1')
+    conn.commit()
+
+
+def data_version():
+    # Read inside the GET snapshot, so the key matches the rows a cache miss builds from
+    return get_conn().execute('SELECT n FROM cache_version WHERE id = 1').fetchone()[0]
+
+
+@functools.lru_cache(maxsize=128)
+def cached_json(build, args, version):
+    # version is only part of the key: a write bumps it and old entries age out of the LRU
+    return encode_json(build(*args))
+
+
+@functools.lru_cache(maxsize=128)
+def cached_json_variant(build, args, version, encoding):
+    # Compressed once per (key, encoding), as the static cache does, so a hit never re-runs gzip/brotli
+    return json_variant(cached_json(build, args, version), encoding)
+
+
+def send_cached_json(handler, build, args, version):
+    encoding = json_encoding(handler, cached_json(build, args, version))
+    write_response(handler, 200, *cached_json_variant(build, args, version, encoding))
+
+
+def search_results(q):
+    c = get_conn().cursor()
+    results = {
+        'customers': [],
+        'products': [],
+        'orders': [],
+        'cases': [],
+    }
+    if q:
+        match = fts_query(q)
+        if match:
+            results['customers'] = fetch_all(c.execute('SELECT cu.* FROM customers cu JOIN customers_fts f ON f.rowid = cu.id WHERE customers_fts MATCH ? ORDER BY f.rank LIMIT 10', (match,)))
+            results['products'] = fetch_all(c.execute('SELECT p.* FROM products p JOIN products_fts f ON f.rowid = p.id WHERE products_fts MATCH ? ORDER BY f.rank LIMIT 10', (match,)))
+        results['orders'] = fetch_all(c.execute('SELECT * FROM orders WHERE id LIKE ? LIMIT 10', (f'%{q}%',)))
+        results['cases'] = fetch_all(c.execute('SELECT * FROM cases WHERE title LIKE ? LIMIT 10', (f'%{q}%',)))
+    return results
+
+
+def dashboard_metrics():
+    # All six counts in one statement
+    row = get_conn().execute(
+        '''SELECT
+            (SELECT COUNT(*) FROM customers),
+            (SELECT COUNT(*) FROM products),
+            (SELECT COUNT(*) FROM orders),
+            (SELECT COUNT(*) FROM cases),
+            (SELECT COUNT(*) FROM cases WHERE status IN ('Open','In Progress')),
+            (SELECT COUNT(*) FROM orders WHERE status IN ('Pending','Confirmed'))'''
+    ).fetchone()
+    customers, products, orders, cases, open_cases, pending_orders = row
+    return {
+        'customers': customers,
+        'products': products,
+        'orders': orders,
+        'cases': cases,
+        'open_cases': open_cases,
+        'pending_orders': pending_orders,
+    }
+
+
 class CRMHandler(BaseHTTPRequestHandler):
+    # Keep connections open between requests; CRMServer parks idle ones in a selector
+    protocol_version = 'HTTP/1.1'
+
+    def handle(self):
+        # Serve what the client already has ready, then return the worker; an idle
+        # keep-alive connection waits for its next request in CRMServer, not here
+        self.handle_one_request()
+        while not self.close_connection and self.request_ready():
+            self.handle_one_request()
+
+    def request_ready(self):
+        # Non-blocking peek: a pipelined request is already in rfile's buffer or on the socket
+        timeout = self.connection.gettimeout()
+        self.connection.settimeout(0)
+        try:
+            return bool(self.rfile.peek(1))
+        except OSError:
+            self.close_connection = True
+            return False
+        finally:
+            self.connection.settimeout(timeout)
+
+    def finish(self):
+        # A parked connection keeps its rfile (and anything buffered in it) for the next dispatch
+        if self.close_connection:
+            super().finish()
+
+    def parse_request(self):
+        if not super().parse_request():
+            return False
+        # Always consume the body so a keep-alive connection stays in sync, even if no handler reads it
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+        except ValueError:
+            self.send_error(400, 'Bad Content-Length')
+            return False
+        self.body = self.rfile.read(length) if length > 0 else b''
+        return True
+
     def do_OPTIONS(self):
         # Basic CORS for local dev
         self.send_response(204)
@@ -257,97 +569,111 @@ class CRMHandler(BaseHTTPRequestHandler):
         self.end_headers()
 
     def do_GET(self):
-        parsed = urlparse(self.path)
-        if parsed.path == '/':
+        path, _, query = self.path.partition('?')
+        if path == '/':
             return self.serve_static('index.html')
-        if parsed.path.startswith('/static/'):
-            rel = parsed.path[len('/static/') :]
+        if path.startswith('/static/'):
+            rel = path[len('/static/') :]
             return self.serve_static(rel)
 
         # API routes
-        if parsed.path.startswith('/api/'):
-            return self.handle_api('GET', parsed)
+        if path.startswith('/api/'):
+            return self.handle_api('GET', path, query)
         return not_found(self)
 
     def do_POST(self):
-        parsed = urlparse(self.path)
-        if parsed.path.startswith('/api/'):
-            return self.handle_api('POST', parsed)
+        path, _, query = self.path.partition('?')
+        if path.startswith('/api/'):
+            return self.handle_api('POST', path, query)
         return not_found(self)
 
     def do_PUT(self):
-        parsed = urlparse(self.path)
-        if parsed.path.startswith('/api/'):
-            return self.handle_api('PUT', parsed)
+        path, _, query = self.path.partition('?')
+        if path.startswith('/api/'):
+            return self.handle_api('PUT', path, query)
         return not_found(self)
 
     def do_DELETE(self):
-        parsed = urlparse(self.path)
-        if parsed.path.startswith('/api/'):
-            return self.handle_api('DELETE', parsed)
+        path, _, query = self.path.partition('?')
+        if path.startswith('/api/'):
+            return self.handle_api('DELETE', path, query)
         return not_found(self)
 
     def serve_static(self, rel_path):
-        safe = os.path.normpath(rel_path).lstrip(os.sep)
-        full = os.path.join(STATIC_DIR, safe)
-        if not os.path.isfile(full):
+        variants = STATIC_CACHE.get(rel_path)
+        if variants is not None:
+            encoding = pick_encoding(self.headers.get('Accept-Encoding', ''), tuple(variants))
+            headers, data, etag = variants[encoding]
+            if etag in self.headers.get('If-None-Match', ''):
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.send_header('Vary', 'Accept-Encoding')
+                self.end_headers()
+                return
+            return write_response(self, 200, headers, data)
+
+        # Files added after startup; anything resolving outside STATIC_DIR (.., absolute paths, symlinks) is a 404
+        full = os.path.realpath(os.path.join(STATIC_DIR, rel_path))
+        if not full.startswith(STATIC_ROOT) or not os.path.isfile(full):
             return not_found(self)
-        ctype = 'text/plain'
-        if full.endswith('.html'):
-            ctype = 'text/html; charset=utf-8'
-        elif full.endswith('.js'):
-            ctype = 'text/javascript; charset=utf-8'
-        elif full.endswith('.css'):
-            ctype = 'text/css; charset=utf-8'
+        ctype = content_type(full)
         with open(full, 'rb') as f:
-            data = f.read()
-        self.send_response(200)
-        self.send_header('Content-Type', ctype)
-        self.send_header('Content-Length', str(len(data)))
-        self.end_headers()
-        self.wfile.write(data)
-
-    def handle_api(self, method, parsed):
-        path = parsed.path
-        # Route patterns
-        routes = [
-            (r'^/api/customers$', self.api_customers),
-            (r'^/api/customers/(\d+)$', self.api_customer_by_id),
-            (r'^/api/products$', self.api_products),
-            (r'^/api/products/(\d+)$', self.api_product_by_id),
-            (r'^/api/orders$', self.api_orders),
-            (r'^/api/orders/(\d+)$', self.api_order_by_id),
-            (r'^/api/cases$', self.api_cases),
-            (r'^/api/cases/(\d+)$', self.api_case_by_id),
-            (r'^/api/search$', self.api_search),
-            (r'^/api/dashboard$', self.api_dashboard),
-        ]
-        for pattern, handler in routes:
-            m = re.match(pattern, path)
-            if m:
-                return handler(method, parsed, *m.groups())
-        return not_found(self)
+            st = os.fstat(f.fileno())
+            etag = f'"{st.st_mtime_ns:x}-{st.st_size:x}"'
+            if etag in self.headers.get('If-None-Match', ''):
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', ctype)
+            self.send_header('Content-Length', str(st.st_size))
+            self.send_header('ETag', etag)
+            self.send_header('Last-Modified', formatdate(st.st_mtime, usegmt=True))
+            self.end_headers()
+            self.wfile.flush()
+            # Let the kernel copy file -> socket (socket.sendfile falls back to send() where unsupported)
+            self.connection.sendfile(f)
+
+    @property
+    def now(self):
+        # One timestamp per request, so every column written by it agrees
+        if self._now is None:
+            self._now = now_iso()
+        return self._now
+
+    def handle_api(self, method, path, query):
+        self._now = None
+        name, args = resolve_route(path)
+        if name is None:
+            return not_found(self)
+        if method == 'GET':
+            # Multi-query reads see one consistent snapshot
+            get_conn().execute('BEGIN DEFERRED')
+        try:
+            return getattr(self, name)(method, query, *args)
+        finally:
+            release_conn()
 
     # Collection handlers
-    def api_customers(self, method, parsed):
+    def api_customers(self, method, query):
         conn = get_conn()
         c = conn.cursor()
         if method == 'GET':
-            qs = parse_qs(parsed.query)
-            q = qs.get('q', [''])[0].strip()
+            q = fts_query(query_param(query, 'q'))
             if q:
-                rows = c.execute(
-                    "SELECT * FROM customers WHERE name LIKE ? OR email LIKE ? ORDER BY created_at DESC",
-                    (f'%{q}%', f'%{q}%'),
-                ).fetchall()
+                rows = fetch_all(c.execute(
+                    'SELECT cu.* FROM customers cu JOIN customers_fts f ON f.rowid = cu.id WHERE customers_fts MATCH ? ORDER BY cu.created_at DESC',
+                    (q,),
+                ))
             else:
-                rows = c.execute('SELECT * FROM customers ORDER BY created_at DESC').fetchall()
-            conn.close()
+                rows = fetch_all(c.execute('SELECT * FROM customers ORDER BY created_at DESC'))
             return send_json(self, 200, rows)
         elif method == 'POST':
             data = parse_json(self)
-            now = now_iso()
-            c.execute(
+            now = self.now
+            row = execute_returning(
+                c,
                 'INSERT INTO customers(name, type, email, phone, status, created_at, updated_at) VALUES (?,?,?,?,?,?,?)',
                 (
                     data.get('name'),
@@ -358,77 +684,59 @@ class CRMHandler(BaseHTTPRequestHandler):
                     now,
                     now,
                 ),
+                'customers',
             )
-            conn.commit()
-            new_id = c.lastrowid
-            row = c.execute('SELECT * FROM customers WHERE id=?', (new_id,)).fetchone()
-            conn.close()
+            commit_write(conn)
             return send_json(self, 201, row)
         else:
-            conn.close()
             return not_found(self)
 
-    def api_customer_by_id(self, method, parsed, cid):
+    def api_customer_by_id(self, method, query, cid):
         cid = int(cid)
         conn = get_conn()
         c = conn.cursor()
         if method == 'GET':
-            row = c.execute('SELECT * FROM customers WHERE id=?', (cid,)).fetchone()
+            row = fetch_one(c.execute('SELECT * FROM customers WHERE id=?', (cid,)))
             # include addresses/contacts
             if not row:
-                conn.close()
                 return not_found(self)
-            row['addresses'] = c.execute('SELECT * FROM addresses WHERE customer_id=?', (cid,)).fetchall()
-            row['contacts'] = c.execute('SELECT * FROM contacts WHERE customer_id=?', (cid,)).fetchall()
-            conn.close()
+            row['addresses'] = fetch_all(c.execute('SELECT * FROM addresses WHERE customer_id=?', (cid,)))
+            row['contacts'] = fetch_all(c.execute('SELECT * FROM contacts WHERE customer_id=?', (cid,)))
             return send_json(self, 200, row)
         elif method == 'PUT':
             data = parse_json(self)
-            now = now_iso()
+            now = self.now
             # Only allow certain fields
-            fields = ['name', 'type', 'email', 'phone', 'status']
-            sets = []
-            vals = []
-            for f in fields:
-                if f in data:
-                    sets.append(f"{f}=?")
-                    vals.append(data[f])
-            sets.append('updated_at=?')
-            vals.append(now)
-            vals.append(cid)
-            c.execute(f"UPDATE customers SET {', '.join(sets)} WHERE id=?", vals)
-            conn.commit()
-            row = c.execute('SELECT * FROM customers WHERE id=?', (cid,)).fetchone()
-            conn.close()
+            fields = pick_fields(data, ('name', 'type', 'email', 'phone', 'status'))
+            vals = [data[f] for f in fields]
+            row = execute_returning(c, update_sql('customers', fields + ('updated_at',)), vals + [now, cid], 'customers', cid)
+            commit_write(conn)
             return send_json(self, 200, row)
         elif method == 'DELETE':
             c.execute('DELETE FROM customers WHERE id=?', (cid,))
-            conn.commit()
-            conn.close()
+            commit_write(conn)
             return send_json(self, 200, {'deleted': True})
         else:
-            conn.close()
             return not_found(self)
 
-    def api_products(self, method, parsed):
+    def api_products(self, method, query):
         conn = get_conn()
         c = conn.cursor()
         if method == 'GET':
-            qs = parse_qs(parsed.query)
-            q = qs.get('q', [''])[0].strip()
+            q = fts_query(query_param(query, 'q'))
             if q:
-                rows = c.execute(
-                    "SELECT * FROM products WHERE name LIKE ? OR sku LIKE ? ORDER BY created_at DESC",
-                    (f'%{q}%', f'%{q}%'),
-                ).fetchall()
+                rows = fetch_all(c.execute(
+                    'SELECT p.* FROM products p JOIN products_fts f ON f.rowid = p.id WHERE products_fts MATCH ? ORDER BY p.created_at DESC',
+                    (q,),
+                ))
             else:
-                rows = c.execute('SELECT * FROM products ORDER BY created_at DESC').fetchall()
-            conn.close()
+                rows = fetch_all(c.execute('SELECT * FROM products ORDER BY created_at DESC'))
             return send_json(self, 200, rows)
         elif method == 'POST':
             data = parse_json(self)
-            now = now_iso()
-            c.execute(
+            now = self.now
+            row = execute_returning(
+                c,
                 'INSERT INTO products(sku, name, description, category, price_cents, currency, is_active, created_at) VALUES (?,?,?,?,?,?,?,?)',
                 (
                     data.get('sku'),
@@ -440,238 +748,278 @@ class CRMHandler(BaseHTTPRequestHandler):
                     1 if data.get('is_active', True) else 0,
                     now,
                 ),
+                'products',
             )
-            conn.commit()
-            new_id = c.lastrowid
-            row = c.execute('SELECT * FROM products WHERE id=?', (new_id,)).fetchone()
-            conn.close()
+            commit_write(conn)
             return send_json(self, 201, row)
         else:
-            conn.close()
             return not_found(self)
 
-    def api_product_by_id(self, method, parsed, pid):
+    def api_product_by_id(self, method, query, pid):
         pid = int(pid)
         conn = get_conn()
         c = conn.cursor()
         if method == 'GET':
-            row = c.execute('SELECT * FROM products WHERE id=?', (pid,)).fetchone()
-            conn.close()
+            row = fetch_one(c.execute('SELECT * FROM products WHERE id=?', (pid,)))
             if not row:
                 return not_found(self)
             return send_json(self, 200, row)
         elif method == 'PUT':
             data = parse_json(self)
-            fields = ['sku', 'name', 'description', 'category', 'price_cents', 'currency', 'is_active']
-            sets = []
-            vals = []
-            for f in fields:
-                if f in data:
-                    val = data[f]
-                    if f in ('price_cents', 'is_active') and val is not None:
-                        val = int(val)
-                    sets.append(f"{f}=?")
-                    vals.append(val)
-            vals.append(pid)
-            if sets:
-                c.execute(f"UPDATE products SET {', '.join(sets)} WHERE id=?", vals)
-                conn.commit()
-            row = c.execute('SELECT * FROM products WHERE id=?', (pid,)).fetchone()
-            conn.close()
+            fields = pick_fields(data, ('sku', 'name', 'description', 'category', 'price_cents', 'currency', 'is_active'))
+            vals = [
+                int(data[f]) if f in ('price_cents', 'is_active') and data[f] is not None else data[f]
+                for f in fields
+            ]
+            if fields:
+                row = execute_returning(c, update_sql('products', fields), vals + [pid], 'products', pid)
+                commit_write(conn)
+            else:
+                row = fetch_one(c.execute('SELECT * FROM products WHERE id=?', (pid,)))
             return send_json(self, 200, row)
         elif method == 'DELETE':
             c.execute('DELETE FROM products WHERE id=?', (pid,))
-            conn.commit()
-            conn.close()
+            commit_write(conn)
             return send_json(self, 200, {'deleted': True})
         else:
-            conn.close()
             return not_found(self)
 
-    def api_orders(self, method, parsed):
+    def api_orders(self, method, query):
         conn = get_conn()
         c = conn.cursor()
         if method == 'GET':
-            rows = c.execute(
+            rows = fetch_all(c.execute(
                 'SELECT o.*, cu.name as customer_name FROM orders o JOIN customers cu ON cu.id = o.customer_id ORDER BY o.created_at DESC'
-            ).fetchall()
-            conn.close()
+            ))
             return send_json(self, 200, rows)
         elif method == 'POST':
             data = parse_json(self)
-            now = now_iso()
+            now = self.now
             customer_id = int(data.get('customer_id'))
             notes = data.get('notes')
             items = data.get('items', [])
+            # One transaction for the order, all of its items and the total
             c.execute('INSERT INTO orders(customer_id, status, total_cents, currency, notes, created_at, updated_at) VALUES (?,?,?,?,?,?,?)',
                       (customer_id, 'Pending', 0, data.get('currency', 'USD'), notes, now, now))
             order_id = c.lastrowid
-            total = 0
-            for item in items:
-                product_id = int(item['product_id'])
-                quantity = int(item.get('quantity', 1))
-                prod = c.execute('SELECT price_cents FROM products WHERE id=?', (product_id,)).fetchone()
-                if not prod:
+            # Load every referenced product's price in one query; unknown products are skipped
+            product_ids = [int(item['product_id']) for item in items]
+            prices = {}
+            if product_ids:
+                placeholders = ','.join('?' * len(product_ids))
+                prices = {
+                    p['id']: p['price_cents']
+                    for p in c.execute(f'SELECT id, price_cents FROM products WHERE id IN ({placeholders})', product_ids).fetchall()
+                }
+            rows = []
+            for item, product_id in zip(items, product_ids):
+                if product_id not in prices:
                     continue
-                unit = int(item.get('unit_price_cents', prod['price_cents']))
-                line = unit * quantity
-                total += line
-                c.execute('INSERT INTO order_items(order_id, product_id, quantity, unit_price_cents, line_total_cents) VALUES (?,?,?,?,?)',
-                          (order_id, product_id, quantity, unit, line))
-            c.execute('UPDATE orders SET total_cents=?, updated_at=? WHERE id=?', (total, now_iso(), order_id))
-            conn.commit()
-            order = c.execute('SELECT * FROM orders WHERE id=?', (order_id,)).fetchone()
-            items = c.execute('SELECT * FROM order_items WHERE order_id=?', (order_id,)).fetchall()
+                quantity = int(item.get('quantity', 1))
+                unit = int(item.get('unit_price_cents', prices[product_id]))
+                rows.append((order_id, product_id, quantity, unit, unit * quantity))
+            c.executemany('INSERT INTO order_items(order_id, product_id, quantity, unit_price_cents, line_total_cents) VALUES (?,?,?,?,?)', rows)
+            total = sum(row[4] for row in rows)
+            order = execute_returning(c, 'UPDATE orders SET total_cents=?, updated_at=? WHERE id=?', (total, now, order_id), 'orders', order_id)
+            commit_write(conn)
+            items = fetch_all(c.execute('SELECT * FROM order_items WHERE order_id=?', (order_id,)))
             order['items'] = items
-            conn.close()
             return send_json(self, 201, order)
         else:
-            conn.close()
             return not_found(self)
 
-    def api_order_by_id(self, method, parsed, oid):
+    def api_order_by_id(self, method, query, oid):
         oid = int(oid)
         conn = get_conn()
         c = conn.cursor()
         if method == 'GET':
-            order = c.execute('SELECT * FROM orders WHERE id=?', (oid,)).fetchone()
+            order = fetch_one(c.execute('SELECT * FROM orders WHERE id=?', (oid,)))
             if not order:
-                conn.close()
                 return not_found(self)
-            items = c.execute('SELECT oi.*, p.sku, p.name FROM order_items oi JOIN products p ON p.id = oi.product_id WHERE order_id=?', (oid,)).fetchall()
+            items = fetch_all(c.execute('SELECT oi.*, p.sku, p.name FROM order_items oi JOIN products p ON p.id = oi.product_id WHERE order_id=?', (oid,)))
             order['items'] = items
-            conn.close()
             return send_json(self, 200, order)
         elif method == 'PUT':
             data = parse_json(self)
-            sets = []
-            vals = []
-            if 'status' in data:
-                sets.append('status=?')
-                vals.append(data['status'])
-            if 'notes' in data:
-                sets.append('notes=?')
-                vals.append(data['notes'])
-            sets.append('updated_at=?')
-            vals.append(now_iso())
-            vals.append(oid)
-            if sets:
-                c.execute(f"UPDATE orders SET {', '.join(sets)} WHERE id=?", vals)
-                conn.commit()
-            order = c.execute('SELECT * FROM orders WHERE id=?', (oid,)).fetchone()
-            conn.close()
+            fields = pick_fields(data, ('status', 'notes'))
+            vals = [data[f] for f in fields]
+            order = execute_returning(c, update_sql('orders', fields + ('updated_at',)), vals + [self.now, oid], 'orders', oid)
+            commit_write(conn)
             return send_json(self, 200, order)
         elif method == 'DELETE':
             c.execute('DELETE FROM orders WHERE id=?', (oid,))
-            conn.commit()
-            conn.close()
+            commit_write(conn)
             return send_json(self, 200, {'deleted': True})
         else:
-            conn.close()
             return not_found(self)
 
-    def api_cases(self, method, parsed):
+    def api_cases(self, method, query):
         conn = get_conn()
         c = conn.cursor()
         if method == 'GET':
-            rows = c.execute(
+            rows = fetch_all(c.execute(
                 'SELECT cs.*, cu.name as customer_name FROM cases cs JOIN customers cu ON cu.id = cs.customer_id ORDER BY cs.created_at DESC'
-            ).fetchall()
-            conn.close()
+            ))
             return send_json(self, 200, rows)
         elif method == 'POST':
             data = parse_json(self)
-            now = now_iso()
-            c.execute('INSERT INTO cases(customer_id, order_id, title, description, status, priority, assignee, created_at, updated_at) VALUES (?,?,?,?,?,?,?,?,?)',
-                      (
-                          int(data['customer_id']),
-                          int(data['order_id']) if data.get('order_id') else None,
-                          data['title'],
-                          data.get('description'),
-                          data.get('status', 'Open'),
-                          data.get('priority', 'Medium'),
-                          data.get('assignee'),
-                          now,
-                          now,
-                      ))
-            conn.commit()
-            new_id = c.lastrowid
-            row = c.execute('SELECT * FROM cases WHERE id=?', (new_id,)).fetchone()
-            conn.close()
+            now = self.now
+            row = execute_returning(
+                c,
+                'INSERT INTO cases(customer_id, order_id, title, description, status, priority, assignee, created_at, updated_at) VALUES (?,?,?,?,?,?,?,?,?)',
+                (
+                    int(data['customer_id']),
+                    int(data['order_id']) if data.get('order_id') else None,
+                    data['title'],
+                    data.get('description'),
+                    data.get('status', 'Open'),
+                    data.get('priority', 'Medium'),
+                    data.get('assignee'),
+                    now,
+                    now,
+                ),
+                'cases',
+            )
+            commit_write(conn)
             return send_json(self, 201, row)
         else:
-            conn.close()
             return not_found(self)
 
-    def api_case_by_id(self, method, parsed, cid):
+    def api_case_by_id(self, method, query, cid):
         cid = int(cid)
         conn = get_conn()
         c = conn.cursor()
         if method == 'GET':
-            row = c.execute('SELECT * FROM cases WHERE id=?', (cid,)).fetchone()
-            conn.close()
+            row = fetch_one(c.execute('SELECT * FROM cases WHERE id=?', (cid,)))
             if not row:
                 return not_found(self)
             return send_json(self, 200, row)
         elif method == 'PUT':
             data = parse_json(self)
-            fields = ['title', 'description', 'status', 'priority', 'assignee']
-            sets = []
-            vals = []
-            for f in fields:
-                if f in data:
-                    sets.append(f"{f}=?")
-                    vals.append(data[f])
-            sets.append('updated_at=?')
-            vals.append(now_iso())
-            vals.append(cid)
-            if sets:
-                c.execute(f"UPDATE cases SET {', '.join(sets)} WHERE id=?", vals)
-                conn.commit()
-            row = c.execute('SELECT * FROM cases WHERE id=?', (cid,)).fetchone()
-            conn.close()
+            fields = pick_fields(data, ('title', 'description', 'status', 'priority', 'assignee'))
+            vals = [data[f] for f in fields]
+            row = execute_returning(c, update_sql('cases', fields + ('updated_at',)), vals + [self.now, cid], 'cases', cid)
+            commit_write(conn)
             return send_json(self, 200, row)
         elif method == 'DELETE':
             c.execute('DELETE FROM cases WHERE id=?', (cid,))
-            conn.commit()
-            conn.close()
+            commit_write(conn)
             return send_json(self, 200, {'deleted': True})
         else:
-            conn.close()
             return not_found(self)
 
-    def api_search(self, method, parsed):
-        qs = parse_qs(parsed.query)
-        q = (qs.get('q', [''])[0]).strip()
-        conn = get_conn()
-        c = conn.cursor()
-        results = {
-            'customers': [],
-            'products': [],
-            'orders': [],
-            'cases': [],
-        }
-        if q:
-            results['customers'] = c.execute('SELECT * FROM customers WHERE name LIKE ? OR email LIKE ? LIMIT 10', (f'%{q}%', f'%{q}%')).fetchall()
-            results['products'] = c.execute('SELECT * FROM products WHERE name LIKE ? OR sku LIKE ? LIMIT 10', (f'%{q}%', f'%{q}%')).fetchall()
-            results['orders'] = c.execute('SELECT * FROM orders WHERE id LIKE ? LIMIT 10', (f'%{q}%',)).fetchall()
-            results['cases'] = c.execute('SELECT * FROM cases WHERE title LIKE ? LIMIT 10', (f'%{q}%',)).fetchall()
-        conn.close()
-        return send_json(self, 200, results)
-
-    def api_dashboard(self, method, parsed):
-        conn = get_conn()
-        c = conn.cursor()
-        metrics = {
-            'customers': c.execute('SELECT COUNT(*) as n FROM customers').fetchone()['n'],
-            'products': c.execute('SELECT COUNT(*) as n FROM products').fetchone()['n'],
-            'orders': c.execute('SELECT COUNT(*) as n FROM orders').fetchone()['n'],
-            'cases': c.execute('SELECT COUNT(*) as n FROM cases').fetchone()['n'],
-            'open_cases': c.execute("SELECT COUNT(*) as n FROM cases WHERE status IN ('Open','In Progress')").fetchone()['n'],
-            'pending_orders': c.execute("SELECT COUNT(*) as n FROM orders WHERE status IN ('Pending','Confirmed')").fetchone()['n'],
-        }
-        conn.close()
-        return send_json(self, 200, metrics)
+    def api_search(self, method, query):
+        q = query_param(query, 'q').strip()
+        return send_cached_json(self, search_results, (q,), data_version())
+
+    def api_dashboard(self, method, query):
+        # Counts may lag a write by at most DASHBOARD_TTL seconds
+        version = (data_version(), int(time.monotonic() // DASHBOARD_TTL))
+        return send_cached_json(self, dashboard_metrics, (), version)
+
+
+class CRMServer(ThreadingHTTPServer):
+    # Requests run on a fixed pool, so threads (and their SQLite connections) are reused
+    # and a flood of clients queues instead of spawning unbounded threads
+    max_workers = 16
+    # socketserver's default listen backlog of 5 resets connections under bursts
+    request_queue_size = 128
+    # A worker waits at most this long on a client that stalls mid-request
+    request_timeout = 5
+    # Connections between requests (including new ones yet to send anything) wait in a
+    # selector rather than on a worker, and are closed after this many idle seconds
+    keep_alive_timeout = 15
+
+    def __init__(self, *args, **kwargs):
+        # Set up before binding: TCPServer calls server_close() if the bind fails
+        self.pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='crm-worker')
+        self.idle = selectors.DefaultSelector()
+        self.idle_lock = threading.Lock()
+        self.closing = False
+        # Wakes the watcher when a connection is parked or the server closes
+        self.wakeup, self.wakeup_send = socket.socketpair()
+        self.wakeup_send.setblocking(False)
+        self.idle.register(self.wakeup, selectors.EVENT_READ)
+        super().__init__(*args, **kwargs)
+        threading.Thread(target=self.watch_idle, name='crm-idle', daemon=True).start()
+
+    def process_request(self, request, client_address):
+        request.settimeout(self.request_timeout)
+        self.park(request, client_address, None)
+
+    def park(self, request, client_address, handler):
+        with self.idle_lock:
+            self.idle.register(request, selectors.EVENT_READ, (client_address, handler, time.monotonic()))
+        self.wake()
+
+    def wake(self):
+        try:
+            self.wakeup_send.send(b'\0')
+        except BlockingIOError:
+            pass  # a wakeup is already pending
+
+    def watch_idle(self):
+        # Hands connections with bytes to read (or EOF) to the pool and expires idle ones
+        next_sweep = time.monotonic() + 1
+        while not self.closing:
+            for key, _mask in self.idle.select(timeout=1):
+                if key.fileobj is self.wakeup:
+                    self.wakeup.recv(4096)
+                    continue
+                with self.idle_lock:
+                    self.idle.unregister(key.fileobj)
+                client_address, handler, _since = key.data
+                try:
+                    self.pool.submit(self.serve_ready, key.fileobj, client_address, handler)
+                except RuntimeError:
+                    # Pool already shut down (server_close or interpreter exit)
+                    self.shutdown_request(key.fileobj)
+                    self.closing = True
+            if time.monotonic() >= next_sweep:
+                self.close_idle(time.monotonic() - self.keep_alive_timeout)
+                next_sweep = time.monotonic() + 1
+        self.close_idle(float('inf'))
+        self.idle.close()
+        self.wakeup.close()
+        self.wakeup_send.close()
+
+    def close_idle(self, cutoff):
+        # Close parked connections idle since before `cutoff`
+        with self.idle_lock:
+            expired = [key for key in self.idle.get_map().values() if key.data is not None and key.data[2] < cutoff]
+            for key in expired:
+                self.idle.unregister(key.fileobj)
+        for key in expired:
+            handler = key.data[1]
+            if handler is not None:
+                handler.close_connection = True
+                handler.finish()
+            self.shutdown_request(key.fileobj)
+
+    def serve_ready(self, request, client_address, handler):
+        # Runs on a pool worker once the client has sent something
+        try:
+            if handler is None:
+                handler = self.RequestHandlerClass(request, client_address, self)
+            else:
+                try:
+                    handler.handle()
+                finally:
+                    handler.finish()
+        except Exception:
+            self.handle_error(request, client_address)
+            self.shutdown_request(request)
+            return
+        if handler.close_connection or self.closing:
+            self.shutdown_request(request)
+        else:
+            self.park(request, client_address, handler)
+
+    def server_close(self):
+        super().server_close()
+        self.closing = True
+        self.wake()
+        self.pool.shutdown(wait=False)
 
 
 def run(host='127.0.0.1', port=8000):
@@ -683,7 +1031,8 @@ def run(host='127.0.0.1', port=8000):
         port = port
     init_db()
     seed_if_empty()
-    httpd = HTTPServer((host, port), CRMHandler)
+    load_static_cache()
+    httpd = CRMServer((host, port), CRMHandler)
     print(f'CRM server running on http://{host}:{port}')
     if host in ('127.0.0.1', 'localhost'):
         print('Open the app at http://127.0.0.1:8000/')
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# Per-request hot paths: routing, row adaptation and PUT/query helpers.
+# Kept typed and free of I/O so it imports as plain Python but can also be
+# compiled with mypyc. Build from inside app/ so the extension lands next to
+# this file, where `import server_core` picks it up ahead of the .py:
+#
+#   cd app && mypyc server_core.py
+#
+# (mypyc writes the .so to the current directory, so running it from the repo
+# root leaves the extension where neither server.py nor asgi.py will find it.)
+import functools
+import re
+import sqlite3
+from typing import Any
+from urllib.parse import unquote_plus
+
+# Route tables (values are CRMHandler method names)
+COLLECTION_ROUTES: dict[str, str] = {
+    '/api/customers': 'api_customers',
+    '/api/products': 'api_products',
+    '/api/orders': 'api_orders',
+    '/api/cases': 'api_cases',
+    '/api/search': 'api_search',
+    '/api/dashboard': 'api_dashboard',
+}
+ITEM_ROUTE = re.compile(r'^/api/(\w+)/(\d+)$')
+ITEM_ROUTES: dict[str, str] = {
+    'customers': 'api_customer_by_id',
+    'products': 'api_product_by_id',
+    'orders': 'api_order_by_id',
+    'cases': 'api_case_by_id',
+}
+
+_WORD = re.compile(r'\w+')
+
+
+def resolve_route(path: str) -> tuple[str | None, tuple[str, ...]]:
+    # Collection routes are exact strings; only /api/<entity>/<id> needs a regex
+    name = COLLECTION_ROUTES.get(path)
+    if name is not None:
+        return name, ()
+    m = ITEM_ROUTE.match(path)
+    if m is None:
+        return None, ()
+    return ITEM_ROUTES.get(m.group(1)), (m.group(2),)
+
+
+def fetch_all(cursor: sqlite3.Cursor) -> list[dict[str, Any]]:
+    # Build column names once per query rather than once per row
+    cols = [d[0] for d in cursor.description]
+    return [dict(zip(cols, row)) for row in cursor.fetchall()]
+
+
+def fetch_one(cursor: sqlite3.Cursor) -> dict[str, Any] | None:
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    return dict(zip([d[0] for d in cursor.description], row))
+
+
+def pick_fields(data: dict[str, Any], allowed: tuple[str, ...]) -> tuple[str, ...]:
+    # Whitelisted fields present in a PUT body, in whitelist order
+    return tuple([f for f in allowed if f in data])
+
+
+@functools.lru_cache(maxsize=None)
+def update_sql(table: str, fields: tuple[str, ...]) -> str:
+    # fields follow each handler's whitelist order, so there is at most one string per subset
+    return f"UPDATE {table} SET {', '.join([f'{f}=?' for f in fields])} WHERE id=?"
+
+
+def pick_encoding(accept: str, available: tuple[str, ...]) -> str:
+    # First of `available` listed in Accept-Encoding (q=0 means refused); '' for identity
+    offered = set()
+    for part in accept.split(','):
+        name, _, params = part.partition(';')
+        name = name.strip().lower()
+        params = params.strip()
+        if not name:
+            continue
+        if params.startswith('q='):
+            try:
+                if float(params[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        offered.add(name)
+    for encoding in available:
+        if encoding in offered:
+            return encoding
+    return ''
+
+
+def query_param(query: str, name: str) -> str:
+    # Pull one parameter out of a raw query string without building a parse_qs dict
+    prefix = name + '='
+    for kv in query.split('&'):
+        if kv.startswith(prefix):
+            return unquote_plus(kv[len(prefix):])
+    return ''
+
+
+def fts_query(q: str) -> str:
+    # Turn free text into an FTS5 prefix query: every word must match the start of a token
+    return ' '.join([f'"{tok}"*' for tok in _WORD.findall(q)])